@@ -7,7 +7,7 @@ import hashlib
 import sqlite3
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import spacy
 from spacy.pipeline import EntityRuler
@@ -129,21 +129,31 @@ class FeedbackRepository:
 REPOSITORY = FeedbackRepository(settings.DB_PATH)
 
 
+def _first_item_values(itens: Iterable[Dict[str, Any]], *groups: Tuple[str, ...]) -> List[str]:
+    """Return the first non-empty value of each key group in a single scan of ``itens``."""
+    found = [""] * len(groups)
+    pending = len(groups)
+    for item in itens:
+        for index, keys in enumerate(groups):
+            if found[index]:
+                continue
+            for key in keys:
+                value = item.get(key)
+                if value:
+                    found[index] = str(value)
+                    pending -= 1
+                    break
+        if not pending:
+            break
+    return found
+
+
 def _build_context(doc: Dict[str, Any]) -> Tuple[str, str, str, str]:
     data = doc.get("data") or {}
     emitente = (data.get("emitente") or {}).get("nome") or ""
     destinatario = (data.get("destinatario") or {}).get("nome") or ""
-    cfop = ""
-    cst = ""
-    ncm = ""
-    for item in data.get("itens", []):
-        if not cfop:
-            cfop = str(item.get("cfop") or "").replace(".", "")
-        if not cst:
-            cst = str(item.get("cst") or item.get("cst_icms") or item.get("cstIcms") or "")
-        if not ncm:
-            ncm = str(item.get("ncm") or "")
-    return emitente, destinatario, cfop, ncm
+    cfop, ncm = _first_item_values(data.get("itens", []), ("cfop",), ("ncm",))
+    return emitente, destinatario, cfop.replace(".", ""), ncm
 
 
 def _branch_from_ncm(ncm: str) -> str:
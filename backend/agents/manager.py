@@ -3,7 +3,6 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import time
 import uuid
 from dataclasses import dataclass, field
@@ -12,6 +11,7 @@ from pathlib import Path
 from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 import aiofiles
+import orjson
 
 from agents.accountant_agent import accountant_agent, compute
 from agents.auditor_agent import audit
@@ -54,8 +54,8 @@ async def _export_logs(logs: List[Dict[str, Any]]) -> None:
         "documents": logs,
     }
     path: Path = settings.processing_log_file
-    async with aiofiles.open(path, "w", encoding="utf-8") as fp:
-        await fp.write(json.dumps(payload, ensure_ascii=False, indent=2))
+    async with aiofiles.open(path, "wb") as fp:
+        await fp.write(orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
 
 
 ProgressCallback = Optional[Callable[[Dict[str, Any]], Awaitable[None]]]
@@ -181,24 +181,26 @@ async def _process_single_document(
                 "regime": accountant_result.get("regime"),
             },
         )
+        itens = data.get("itens", [])
+        valor_total = sum(float(i.get("valor", 0) or 0) for i in itens)
         source_snapshot = {
             "emitente": data.get("emitente"),
             "destinatario": data.get("destinatario"),
-            "itens": data.get("itens", []),
+            "itens": itens,
             "impostos": data.get("impostos", {}),
         }
         report = {
             "documentId": document_id,
             "title": f"Relatório - {doc.get('name', document_id)}",
             "kpis": [
-                {"label": "Itens", "value": len(data.get("itens", []))},
+                {"label": "Itens", "value": len(itens)},
                 {
                     "label": "Score Conformidade",
                     "value": compliance.get("score", 0),
                 },
                 {
                     "label": "Valor Total",
-                    "value": round(sum(float(i.get("valor", 0) or 0) for i in data.get("itens", [])), 2),
+                    "value": round(valor_total, 2),
                 },
             ],
             "classification": classifier_result,
@@ -1,4 +1,8 @@
-import json, sys, time
+import sys, time
+
+import orjson
+
+
 def log_event(agent:str, level:str, message:str, meta:dict|None=None):
     rec = {
         "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
@@ -7,5 +11,5 @@ def log_event(agent:str, level:str, message:str, meta:dict|None=None):
         "message": message,
         "meta": meta or {}
     }
-    sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    sys.stdout.write(orjson.dumps(rec, option=orjson.OPT_NON_STR_KEYS).decode() + "\n")
     sys.stdout.flush()
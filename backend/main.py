@@ -1,6 +1,5 @@
 import asyncio
 import io
-import json
 import mimetypes
 import uuid
 from datetime import datetime, timezone
@@ -9,7 +8,8 @@ from typing import Any, Dict, List
 
 from fastapi import Body, FastAPI, File, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 from agents.accountant_agent import compute
@@ -31,6 +31,7 @@ from backend.models import (
     OrchestratorRequest,
     OrchestratorResult,
 )
+from services.export_bundle import build_bundle
 from services.export_docx import build_docx
 from services.export_html import build_html
 from services.export_pdf import build_pdf
@@ -41,7 +42,19 @@ from utils.aggregator import merge_results
 from utils.fiscal_compare import compare_docs
 from utils.progress_stream import progress_manager
 
-app = FastAPI(title="Nexus Python Backend", version="1.2")
+
+class _SSEPassthroughGZipMiddleware(GZipMiddleware):
+    """Gzip responses, except ``/stream`` SSE endpoints, which pass through unbuffered."""
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+app = FastAPI(title="Nexus Python Backend", version="1.2", default_response_class=ORJSONResponse)
+app.add_middleware(_SSEPassthroughGZipMiddleware, minimum_size=1024, compresslevel=6)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -276,7 +289,7 @@ async def upload_zip(file: UploadFile = File(...)):
     if not docs:
         raise HTTPException(422, "Nenhum arquivo válido encontrado no ZIP.")
     result = await process_documents_pipeline(docs)
-    return JSONResponse(result)
+    return ORJSONResponse(result)
 
 @app.post("/upload/file")
 async def upload_file(file: UploadFile = File(...)):
@@ -292,7 +305,7 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(400, "MIME type não autorizado.")
     doc = parse_file(file.filename, content, mime)
     result = await process_documents_pipeline([doc])
-    return JSONResponse(result)
+    return ORJSONResponse(result)
 
 
 @app.post("/upload/multiple")
@@ -304,7 +317,7 @@ async def upload_multiple(files: List[UploadFile] = File(...)):
 
     result = await process_documents_pipeline(docs)
     aggregated = merge_results(result.get("reports", []))
-    return JSONResponse({**result, "aggregated": aggregated})
+    return ORJSONResponse({**result, "aggregated": aggregated})
 
 
 @app.post("/compare-incremental")
@@ -321,14 +334,14 @@ async def compare_incremental(payload: Dict[str, Dict[str, Dict[str, float]]]):
         for key in keys
     }
 
-    return JSONResponse(content={"differences": differences})
+    return ORJSONResponse(content={"differences": differences})
 
 
 @app.post("/interdoc/compare")
 async def interdoc_compare(payload: Dict[str, Any] = Body(...)):
     docs = (payload or {}).get("docs") or []
     result = compare_docs(docs)
-    return JSONResponse(content={"status": "ok", "result": result})
+    return ORJSONResponse(content={"status": "ok", "result": result})
 
 
 @app.post("/export/docx")
@@ -355,6 +368,14 @@ async def export_sped(payload: ReportRequest):
     return StreamingResponse(io.BytesIO(buf), media_type="text/plain",
                              headers={"Content-Disposition": f"attachment; filename={filename}"})
 
+@app.post("/export/bundle")
+async def export_bundle(payload: ReportRequest):
+    buf, filename, omitted = build_bundle(payload.dataset)
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if omitted:
+        headers["X-Export-Omitted"] = ",".join(omitted)
+    return StreamingResponse(io.BytesIO(buf), media_type="application/zip", headers=headers)
+
 
 async def _run_pipeline_job(job_id: str, docs: List[Dict[str, Any]]) -> None:
     async def _callback(event: Dict[str, Any]) -> None:
@@ -412,7 +433,7 @@ async def create_pipeline_job(files: List[UploadFile] = File(...)):
     job_id = str(uuid.uuid4())
     await progress_manager.create_job(job_id)
     asyncio.create_task(_run_pipeline_job(job_id, docs))
-    return JSONResponse({"job_id": job_id})
+    return ORJSONResponse({"job_id": job_id})
 
 
 @app.get("/pipeline/jobs/{job_id}")
@@ -420,7 +441,7 @@ async def get_pipeline_job(job_id: str):
     result = progress_manager.get_result(job_id)
     if result is None:
         raise HTTPException(404, "Resultado ainda não disponível ou job inexistente.")
-    return JSONResponse(result)
+    return ORJSONResponse(result)
 
 
 @app.get("/pipeline/jobs/{job_id}/stream")
@@ -435,7 +456,7 @@ async def stream_pipeline_job(job_id: str):
                 event = await queue.get()
                 if event is None:
                     break
-                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                yield b"id: %d\ndata: %b\n\n" % (event.seq, event.payload)
         finally:
             await progress_manager.discard(job_id, queue)
 
@@ -0,0 +1,46 @@
+"""Single-archive export with every report format."""
+
+from __future__ import annotations
+
+import io
+import json
+import zipfile
+from typing import Any, Dict, List, Tuple
+
+from core.logger import log_event
+from core.settings import settings
+from services.export_docx import build_docx
+from services.export_html import build_html
+from services.export_pdf import build_pdf
+from services.export_sped import build_sped_efd
+
+
+def build_bundle(dataset: Dict[str, Any]) -> Tuple[bytes, str, List[str]]:
+    """Zip DOCX, PDF and HTML reports, plus SPED when it can be built.
+
+    SPED is silently left out of the archive when ``ENABLE_SPED_EXPORT`` is off
+    or its builder fails; the omitted formats are returned and listed in the
+    archive's ``manifest.json`` so callers can tell.
+    """
+    buffer = io.BytesIO()
+    included: List[str] = []
+    omitted: List[str] = []
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for builder in (build_docx, build_pdf, build_html):
+            content, filename = builder(dataset)
+            archive.writestr(filename, content)
+            included.append(filename)
+        if not settings.ENABLE_SPED_EXPORT:
+            omitted.append("sped")
+        else:
+            try:
+                content, filename = build_sped_efd(dataset)
+            except Exception as exc:
+                log_event("export", "WARNING", "SPED omitido do pacote", {"error": str(exc)})
+                omitted.append("sped")
+            else:
+                archive.writestr(filename, content)
+                included.append(filename)
+        manifest = {"included": included, "omitted": omitted}
+        archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+    return buffer.getvalue(), "relatorios.zip", omitted
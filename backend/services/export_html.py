@@ -15,9 +15,13 @@ th,td{border:1px solid #ddd;padding:6px;font-size:14px}th{background:#f0f0f0}</s
 {% for i in inconsistencies %}<tr><td>{{i.field}}</td><td>{{i.code}}</td><td>{{i.severity}}</td><td>{{i.message}}</td></tr>{% endfor %}
 </table></body></html>
 """
+# Compiled once at import; Template() parses and compiles the source each time.
+HTML_TEMPLATE = Template(HTML_TPL)
+
 def build_html(dataset: dict):
-    tpl = Template(HTML_TPL)
-    html = tpl.render(title=dataset.get("title","Relatório Fiscal"),
-                      kpis=dataset.get("kpis",[]),
-                      inconsistencies=dataset.get("compliance",{}).get("inconsistencies",[]))
+    html = HTML_TEMPLATE.render(
+        title=dataset.get("title", "Relatório Fiscal"),
+        kpis=dataset.get("kpis", []),
+        inconsistencies=dataset.get("compliance", {}).get("inconsistencies", []),
+    )
     return html, "relatorio.html"
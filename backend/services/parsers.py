@@ -13,12 +13,16 @@ from core.logger import log_event
 from core.settings import settings
 
 
+_WHITESPACE_RE = re.compile(r"[\s]+")
+_UNSAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
 def secure_filename(value: str) -> str:
     """Simplified secure filename implementation (Werkzeug compatible signature)."""
     if not value:
         return "document"
-    value = re.sub(r"[\s]+", "_", value.strip())
-    value = re.sub(r"[^A-Za-z0-9_.-]", "", value)
+    value = _WHITESPACE_RE.sub("_", value.strip())
+    value = _UNSAFE_FILENAME_RE.sub("", value)
     value = value.lstrip(".")
     return value or "document"
 
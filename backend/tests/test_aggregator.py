@@ -0,0 +1,28 @@
+import math
+
+from backend.utils.aggregator import as_float_array, merge_results
+
+
+def test_as_float_array_zeroes_missing_unparseable_and_nan():
+    values = as_float_array([None, "", "abc", float("nan"), "NaN", "10.5", 3, False])
+
+    assert values.tolist() == [0.0, 0.0, 0.0, 0.0, 0.0, 10.5, 3.0, 0.0]
+
+
+def test_merge_results_treats_nan_as_zero_and_returns_floats():
+    reports = [
+        {
+            "title": "A",
+            "source": {"itens": [{"valor": "100.5"}, {"valor": float("nan")}, {"valor": None}]},
+            "taxes": {"resumo": {"totalICMS": "NaN", "totalPIS": 2, "totalCOFINS": "x"}},
+            "compliance": {"score": 7},
+        },
+        {"title": "B", "source": {"itens": []}},
+    ]
+
+    merged = merge_results(reports)
+
+    assert merged["totals"] == {"vNF": 100.5, "vProd": 100.5, "vICMS": 0.0, "vPIS": 2.0, "vCOFINS": 0.0}
+    assert not any(math.isnan(value) for value in merged["totals"].values())
+    assert [doc["valorProdutos"] for doc in merged["docs"]] == [100.5, 0.0]
+    assert all(isinstance(doc["valorProdutos"], float) for doc in merged["docs"])
@@ -0,0 +1,50 @@
+import io
+import json
+import zipfile
+
+from core.settings import settings
+from services import export_bundle
+
+DATASET = {"title": "Relatório", "kpis": [{"label": "Docs", "value": "1"}]}
+
+
+def _names(buf):
+    return sorted(zipfile.ZipFile(io.BytesIO(buf)).namelist())
+
+
+def _manifest(buf):
+    return json.loads(zipfile.ZipFile(io.BytesIO(buf)).read("manifest.json"))
+
+
+def test_bundle_skips_sped_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_SPED_EXPORT", False)
+    buf, filename, omitted = export_bundle.build_bundle(DATASET)
+
+    assert filename == "relatorios.zip"
+    assert omitted == ["sped"]
+    assert _names(buf) == ["manifest.json", "relatorio.docx", "relatorio.html", "relatorio.pdf"]
+    assert _manifest(buf)["omitted"] == ["sped"]
+
+
+def test_bundle_skips_sped_when_it_fails(monkeypatch):
+    def broken_sped(dataset):
+        raise ValueError("schema")
+
+    monkeypatch.setattr(settings, "ENABLE_SPED_EXPORT", True)
+    monkeypatch.setattr(export_bundle, "build_sped_efd", broken_sped)
+    buf, _, omitted = export_bundle.build_bundle(DATASET)
+
+    assert omitted == ["sped"]
+    assert _names(buf) == ["manifest.json", "relatorio.docx", "relatorio.html", "relatorio.pdf"]
+
+
+def test_bundle_includes_sped_when_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_SPED_EXPORT", True)
+    buf, _, omitted = export_bundle.build_bundle(DATASET)
+
+    assert omitted == []
+    assert "sped_efd_validado.xml" in _names(buf)
+    assert _manifest(buf) == {
+        "included": ["relatorio.docx", "relatorio.pdf", "relatorio.html", "sped_efd_validado.xml"],
+        "omitted": [],
+    }
@@ -0,0 +1,40 @@
+from backend.utils.fiscal_compare import FISCAL_KEYS, TOTAL_KEYS, _norm, compare_docs
+
+
+def _reference_pairs(docs):
+    # Straight pairwise loop, as compare_docs computed it before vectorising.
+    pairs = []
+    for i in range(len(docs)):
+        for j in range(i + 1, len(docs)):
+            a, b = docs[i], docs[j]
+            diffs = {}
+            for key in FISCAL_KEYS:
+                aval, bval = _norm(a.get(key)), _norm(b.get(key))
+                if aval and bval and aval != bval:
+                    diffs[key] = {"a": aval, "b": bval}
+            for key in TOTAL_KEYS:
+                aval, bval = float(a.get(key) or 0.0), float(b.get(key) or 0.0)
+                if abs(aval - bval) > 1e-6:
+                    diffs[key] = {"a": aval, "b": bval, "delta": bval - aval}
+            if diffs:
+                pairs.append((a.get("source"), b.get("source"), diffs))
+    return pairs
+
+
+def test_compare_docs_pairs_match_pairwise_reference():
+    docs = [
+        {"source": "a.xml", "cfop": "5102", "ncm": "1001", "vNF": 100.0, "vICMS": 18.0},
+        {"source": "b.xml", "cfop": "5102 ", "ncm": "1002", "vNF": "100.0", "vICMS": 12},
+        {"source": "c.xml", "cfop": "6102", "cst": "00", "vNF": 250.5, "vPIS": None},
+        {"source": "d.xml", "cfop": "5102", "ncm": "1001", "vNF": 100.0, "vICMS": 18.0},
+    ]
+
+    result = compare_docs(docs)
+
+    pairs = [(item["a_source"], item["b_source"], item["diffs"]) for item in result["discrepancies"]]
+    assert pairs == _reference_pairs(docs)
+    assert result["summary"]["by_cfop"] == {"5102": 3, "6102": 1}
+
+
+def test_compare_docs_handles_empty_input():
+    assert compare_docs([])["discrepancies"] == []
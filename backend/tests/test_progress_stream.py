@@ -0,0 +1,36 @@
+import asyncio
+
+from backend.utils.progress_stream import ProgressManager
+
+
+def test_results_are_bounded_by_max_size():
+    manager = ProgressManager(max_results=2)
+    for job_id in ("a", "b", "c"):
+        manager.set_result(job_id, {"status": "completed", "job": job_id})
+
+    assert manager.get_result("a") is None
+    assert manager.get_result("b") == {"status": "completed", "job": "b"}
+    assert manager.get_result("c") == {"status": "completed", "job": "c"}
+
+
+def test_results_expire_after_ttl():
+    manager = ProgressManager(result_ttl=0)
+    manager.set_result("job", {"status": "completed"})
+
+    assert manager.get_result("job") is None
+
+
+def test_published_events_are_sequenced_per_job():
+    async def scenario():
+        manager = ProgressManager()
+        await manager.create_job("job")
+        queue = await manager.subscribe("job")
+        await manager.publish("job", {"type": "stage", "stage": "parse"})
+        await manager.finalize("job")
+        return [await queue.get() for _ in range(3)]
+
+    stage, closed, sentinel = asyncio.run(scenario())
+
+    assert (stage.type, stage.seq, stage.payload) == ("stage", 1, b'{"type":"stage","stage":"parse"}')
+    assert (closed.type, closed.seq) == ("job", 2)
+    assert sentinel is None
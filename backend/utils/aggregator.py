@@ -2,37 +2,49 @@ from __future__ import annotations
 
 from typing import Any, Dict, Iterable, List
 
+import numpy as np
+import pandas as pd
 
-def _to_float(value: Any) -> float:
-    try:
-        return float(value or 0)
-    except (TypeError, ValueError):  # pragma: no cover - defensive
-        return 0.0
+TAX_TOTALS = (("vICMS", "totalICMS"), ("vPIS", "totalPIS"), ("vCOFINS", "totalCOFINS"))
+
+
+def as_float_array(values: List[Any]) -> np.ndarray:
+    """Coerce raw numbers to float64 in one pass; missing, NaN or unparseable values become 0.0."""
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=np.float64)
 
 
 def merge_results(reports: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
-    docs: List[Dict[str, Any]] = []
-    totals = {"vNF": 0.0, "vProd": 0.0, "vICMS": 0.0, "vPIS": 0.0, "vCOFINS": 0.0}
+    reports = list(reports)
+    valores: List[Any] = []
+    contagens: List[int] = []
+    resumos: List[Any] = []
 
     for report in reports:
-        source = report.get("source") or {}
-        itens = source.get("itens") or []
-        valor_produtos = sum(_to_float(item.get("valor")) for item in itens)
-        totals["vProd"] += valor_produtos
-        totals["vNF"] += valor_produtos
-
+        itens = (report.get("source") or {}).get("itens") or []
+        valores.extend(item.get("valor") for item in itens)
+        contagens.append(len(itens))
         taxes_resumo = ((report.get("taxes") or {}).get("resumo") or {})
-        totals["vICMS"] += _to_float(taxes_resumo.get("totalICMS"))
-        totals["vPIS"] += _to_float(taxes_resumo.get("totalPIS"))
-        totals["vCOFINS"] += _to_float(taxes_resumo.get("totalCOFINS"))
-
-        docs.append(
-            {
-                "documentId": report.get("documentId"),
-                "title": report.get("title"),
-                "valorProdutos": valor_produtos,
-                "score": (report.get("compliance") or {}).get("score"),
-            }
-        )
+        resumos.extend(taxes_resumo.get(field) for _, field in TAX_TOTALS)
+    impostos = as_float_array(resumos).reshape(len(reports), len(TAX_TOTALS))
+
+    # Per-report item sums in one reduction over the flattened items.
+    valores_produtos = np.bincount(
+        np.repeat(np.arange(len(reports), dtype=np.intp), contagens),
+        weights=as_float_array(valores),
+        minlength=len(reports),
+    )
+    vprod = float(valores_produtos.sum())
+    totals = {"vNF": vprod, "vProd": vprod}
+    totals.update(zip((key for key, _ in TAX_TOTALS), impostos.sum(axis=0).tolist()))
+
+    docs = [
+        {
+            "documentId": report.get("documentId"),
+            "title": report.get("title"),
+            "valorProdutos": valor_produtos,
+            "score": (report.get("compliance") or {}).get("score"),
+        }
+        for report, valor_produtos in zip(reports, valores_produtos.tolist())
+    ]
 
     return {"docs": docs, "totals": totals}
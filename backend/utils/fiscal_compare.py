@@ -3,6 +3,10 @@ from __future__ import annotations
 
 from typing import Any, Dict, List
 
+import numpy as np
+
+from utils.aggregator import as_float_array
+
 FISCAL_KEYS = [
     "cfop",
     "cst",
@@ -15,6 +19,8 @@ FISCAL_KEYS = [
 
 TOTAL_KEYS = ["vNF", "vProd", "vICMS", "vPIS", "vCOFINS"]
 
+SUMMARY_COLUMNS = [(f"by_{key}", FISCAL_KEYS.index(key)) for key in ("cfop", "ncm", "cst")]
+
 
 def _norm(value: Any) -> str:
     if value is None:
@@ -31,33 +37,43 @@ def compare_docs(docs: List[Dict[str, Any]]) -> Dict[str, Any]:
         "by_cst": {},
     }
 
-    for doc in docs:
-        cfop = _norm(doc.get("cfop"))
-        ncm = _norm(doc.get("ncm"))
-        cst = _norm(doc.get("cst"))
+    total_docs = len(docs)
+    # Keys are normalized once; the summary counts reuse the same rows.
+    fiscal = [[_norm(doc.get(key)) for key in FISCAL_KEYS] for doc in docs]
+    for row in fiscal:
+        for bucket, index in SUMMARY_COLUMNS:
+            counts = summary[bucket]
+            counts[row[index]] = counts.get(row[index], 0) + 1
 
-        summary["by_cfop"][cfop] = summary["by_cfop"].get(cfop, 0) + 1
-        summary["by_ncm"][ncm] = summary["by_ncm"].get(ncm, 0) + 1
-        summary["by_cst"][cst] = summary["by_cst"].get(cst, 0) + 1
+    totals = as_float_array([doc.get(key) for doc in docs for key in TOTAL_KEYS]).reshape(total_docs, len(TOTAL_KEYS))
+    totals_rows = totals.tolist()
 
-    total_docs = len(docs)
     for i in range(total_docs):
-        for j in range(i + 1, total_docs):
-            a = docs[i]
+        a = docs[i]
+        a_fiscal = fiscal[i]
+        a_totals = totals_rows[i]
+        # One row of deltas at a time keeps memory O(N) instead of N x N.
+        deltas = totals[i + 1:] - totals[i]
+        delta_rows = deltas.tolist()
+        divergent_rows = (np.abs(deltas) > 1e-6).tolist()
+        for offset, j in enumerate(range(i + 1, total_docs)):
             b = docs[j]
             diffs: Dict[str, Any] = {}
 
-            for key in FISCAL_KEYS:
-                aval = _norm(a.get(key))
-                bval = _norm(b.get(key))
+            for key, aval, bval in zip(FISCAL_KEYS, a_fiscal, fiscal[j]):
                 if aval and bval and aval != bval:
                     diffs[key] = {"a": aval, "b": bval}
 
-            for key in TOTAL_KEYS:
-                aval = float(a.get(key) or 0.0)
-                bval = float(b.get(key) or 0.0)
-                if abs(aval - bval) > 1e-6:
-                    diffs[key] = {"a": aval, "b": bval, "delta": bval - aval}
+            divergent = divergent_rows[offset]
+            if any(divergent):
+                b_totals = totals_rows[j]
+                for k, key in enumerate(TOTAL_KEYS):
+                    if divergent[k]:
+                        diffs[key] = {
+                            "a": a_totals[k],
+                            "b": b_totals[k],
+                            "delta": delta_rows[offset][k],
+                        }
 
             if diffs:
                 discrepancies.append(
@@ -3,15 +3,48 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, List, Optional
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+
+def encode_event(event: Dict[str, Any]) -> bytes:
+    """Serialise an event once so every subscriber shares the same payload."""
+
+    return orjson.dumps(event, option=orjson.OPT_NON_STR_KEYS)
+
+
+@dataclass(slots=True, frozen=True)
+class ProgressEvent:
+    """Queued progress update with its JSON body already encoded."""
+
+    type: str
+    job_id: str
+    seq: int
+    payload: bytes
+
+
+RESULT_TTL_SECONDS = 3600.0
+MAX_CACHED_RESULTS = 1024
 
 
 class ProgressManager:
     """Manage job-scoped progress queues and final results in memory."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        result_ttl: float = RESULT_TTL_SECONDS,
+        max_results: int = MAX_CACHED_RESULTS,
+    ) -> None:
         self._queues: Dict[str, List[asyncio.Queue]] = {}
-        self._results: Dict[str, Any] = {}
+        self._sequences: Dict[str, int] = {}
+        # Insertion order doubles as expiry order because the TTL is fixed.
+        self._results: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._result_ttl = result_ttl
+        self._max_results = max_results
         self._lock = asyncio.Lock()
 
     async def create_job(self, job_id: str) -> None:
@@ -20,11 +53,15 @@ class ProgressManager:
         async with self._lock:
             if job_id not in self._queues:
                 self._queues[job_id] = []
+                self._sequences[job_id] = 0
             # Drop any stale cached result for a recycled identifier.
             self._results.pop(job_id, None)
 
     async def subscribe(self, job_id: str) -> Optional[asyncio.Queue]:
-        """Register a new subscriber queue for a job."""
+        """Register a new subscriber queue for a job.
+
+        Queues carry :class:`ProgressEvent` items followed by a ``None`` sentinel.
+        """
 
         async with self._lock:
             if job_id not in self._queues:
@@ -37,13 +74,44 @@ class ProgressManager:
         queues = self._queues.get(job_id)
         if not queues:
             return
-        await asyncio.gather(*(queue.put(event) for queue in list(queues)))
+        progress_event = self._next_event(job_id, event)
+        await asyncio.gather(*(queue.put(progress_event) for queue in list(queues)))
+
+    def _next_event(self, job_id: str, event: Dict[str, Any]) -> ProgressEvent:
+        seq = self._sequences.get(job_id, 0) + 1
+        self._sequences[job_id] = seq
+        return ProgressEvent(
+            type=str(event.get("type") or ""),
+            job_id=job_id,
+            seq=seq,
+            payload=encode_event(event),
+        )
 
     def set_result(self, job_id: str, result: Any) -> None:
-        self._results[job_id] = result
+        """Cache a final result; entries expire after the TTL or when the cache is full."""
+
+        now = time.monotonic()
+        self._results.pop(job_id, None)
+        self._results[job_id] = (now + self._result_ttl, result)
+        self._evict(now)
 
     def get_result(self, job_id: str) -> Optional[Any]:
-        return self._results.get(job_id)
+        entry = self._results.get(job_id)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if time.monotonic() >= expires_at:
+            self._results.pop(job_id, None)
+            return None
+        return result
+
+    def _evict(self, now: float) -> None:
+        results = self._results
+        while results:
+            oldest = next(iter(results))
+            if len(results) <= self._max_results and results[oldest][0] > now:
+                break
+            del results[oldest]
 
     async def finalize(self, job_id: str) -> None:
         """Push the completion sentinel to subscribers."""
@@ -51,7 +119,7 @@ class ProgressManager:
         queues = self._queues.get(job_id)
         if not queues:
             return
-        closing = {"type": "job", "status": "closed", "job_id": job_id}
+        closing = self._next_event(job_id, {"type": "job", "status": "closed", "job_id": job_id})
         await asyncio.gather(*(queue.put(closing) for queue in list(queues)))
         await asyncio.gather(*(queue.put(None) for queue in list(queues)))
 
@@ -61,6 +129,7 @@ class ProgressManager:
         async with self._lock:
             if queue is None:
                 self._queues.pop(job_id, None)
+                self._sequences.pop(job_id, None)
                 return
             watchers = self._queues.get(job_id)
             if not watchers:
@@ -71,6 +140,7 @@ class ProgressManager:
                 return
             if not watchers:
                 self._queues.pop(job_id, None)
+                self._sequences.pop(job_id, None)
 
     def forget(self, job_id: str) -> None:
         """Explicitly remove cached results when no longer needed."""
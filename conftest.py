@@ -6,6 +6,10 @@ import sys
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent
+BACKEND = ROOT / "backend"
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+# The backend runs from its own directory and imports ``core``/``services``/``utils`` absolutely.
+if str(BACKEND) not in sys.path:
+    sys.path.append(str(BACKEND))
 
@@ -1,22 +1,36 @@
 ﻿from __future__ import annotations
 
+import hashlib
 import html
-import json
+import io
 import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from string import Template
-from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
 
-import pandas as pd
+import orjson
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 if not hasattr(st, "experimental_rerun") and hasattr(st, "rerun"):
     st.experimental_rerun = st.rerun  # type: ignore[attr-defined]
 
+# numpy and pandas are imported where they are used: the upload view never
+# needs them, so a cold worker only pays for them once results exist.
 if TYPE_CHECKING:  # pragma: no cover
+    import numpy as np
+    import pandas as pd
+    from streamlit.delta_generator import DeltaGenerator
     from streamlit.runtime.uploaded_file_manager import UploadedFile
 
+from utils.formatting import format_brl, format_brl_series, format_file_size_series
 from utils.insights import render_discrepancies_panel, show_incremental_insights
 
 
@@ -44,14 +58,40 @@ AGENT_STEPS = [
     ("accountant", "5. Ag. Contador"),
 ]
 
+PROGRESS_STEP_TEMPLATE = (
+    "<div class='nxq-progress-step'><div class='nxq-progress-node %s'>%s</div>"
+    "<div class='nxq-progress-label'>%s</div></div>"
+)
+PROGRESS_CONNECTOR = "<div class='nxq-progress-connector'></div>"
+
 EXPORT_ENDPOINTS = {
     "docx": ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", "relatorio.docx"),
     "html": ("html", "text/html", "relatorio.html"),
     "pdf": ("pdf", "application/pdf", "relatorio.pdf"),
     "md": ("md", "text/markdown", "relatorio.md"),
     "sped": ("sped", "text/plain", "sped_efd.txt"),
+    "zip": ("bundle", "application/zip", "relatorios.zip"),
 }
 
+TAX_SUMMARY_FIELDS = ("totalICMS", "totalPIS", "totalCOFINS")
+
+UPLOAD_WORKERS = 8
+UPLOAD_SPOOL_BYTES = 8 << 20
+MULTIPART_FILENAME_ESCAPES = str.maketrans({'"': "%22", "\r": "%0D", "\n": "%0A"})
+PROCESSED_UPLOADS_LIMIT = 64
+EXPORT_CHUNK_BYTES = 64 << 10
+PROGRESS_REFRESH_SECONDS = 0.1
+LOGS_DISPLAY_LIMIT = 200
+
+DASHBOARD_COLUMNS = ["Documento", "Valor dos Produtos", "Score"]
+
+CHAT_BUBBLE_TEMPLATE = "<div class='nxq-chat-bubble %s'>%s</div>"
+CHAT_ROLE_CLASSES = {"user": "user"}
+# Same escapes as html.escape(quote=True), plus line breaks, in one pass.
+CHAT_HTML_ESCAPES = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;", "\n": "<br>"}
+)
+
 INITIAL_CHAT_MESSAGE = {
     "id": "assistant-hello",
     "sender": "ai",
@@ -59,18 +99,44 @@ INITIAL_CHAT_MESSAGE = {
 }
 
 
-def _format_brl(value: float) -> str:
-    return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+@st.cache_resource(show_spinner=False)
+def _http() -> requests.Session:
+    """Pooled session shared across reruns; the script body re-executes on every interaction."""
+    adapter = HTTPAdapter(
+        pool_connections=UPLOAD_WORKERS,
+        pool_maxsize=UPLOAD_WORKERS * 2,
+        # POST is not retried on status by default; every call here is one,
+        # and both bodies (bytes, _MultipartUpload) can be replayed. Only a
+        # 503 is retried: the backend refused the request outright. A
+        # 502/504 from a gateway, like a read error, can mean the backend
+        # is still processing it, and a replay would run the work again.
+        max_retries=Retry(
+            total=3,
+            read=0,
+            backoff_factor=0.3,
+            status_forcelist=[503],
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        ),
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
-def _format_file_size(size_bytes: Optional[float]) -> str:
-    if size_bytes is None:
-        return "-"
-    return f"{size_bytes / 1024:.1f} KB"
+def _prepare_payload(file: "UploadedFile") -> Tuple[str, BinaryIO, str]:
+    # Spool instead of holding the uploader's buffer: large files move to disk
+    # and are streamed from there by requests.
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    spool.write(file.getbuffer())
+    spool.seek(0)
+    return file.name, spool, file.type or "application/octet-stream"
 
 
-def _prepare_payload(file: "UploadedFile") -> Tuple[str, bytes, str]:
-    return file.name, file.getvalue(), file.type or "application/octet-stream"
+def _release_payloads(queue: Iterable[Dict[str, Any]]) -> None:
+    for entry in queue:
+        entry["payload"][1].close()
 
 
 def _set_toast(message: Optional[str], level: str = "error") -> None:
@@ -80,42 +146,117 @@ def _set_toast(message: Optional[str], level: str = "error") -> None:
 def _clear_analysis_state() -> None:
     st.session_state["analysis_results"] = []
     st.session_state["aggregated_overview"] = None
-    st.session_state["aggregated_totals"] = {}
-    st.session_state["aggregated_docs"] = []
-    st.session_state["logs_payload"] = []
 
 
-def process_uploaded_file(payload: Tuple[str, bytes, str]) -> Dict[str, Any]:
-    name, content, mime = payload
+class _MultipartUpload(io.RawIOBase):
+    """Single-file multipart body read straight from the spooled upload.
+
+    requests only buffers ``files=`` bodies in memory; this one is streamed
+    with a Content-Length, and because it is seekable urllib3 can rewind
+    it when the session's Retry replays the POST.
+    """
+
+    def __init__(self, name: str, handle: BinaryIO, mime: str, boundary: str) -> None:
+        filename = name.translate(MULTIPART_FILENAME_ESCAPES)
+        self._head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: {mime}\r\n\r\n"
+        ).encode("utf-8")
+        self._tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+        self._handle = handle
+        self._body_end = len(self._head) + handle.seek(0, os.SEEK_END)
+        self._position = 0
+
+    def __len__(self) -> int:
+        return self._body_end + len(self._tail)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._position, os.SEEK_END: len(self)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, buffer: Any) -> int:
+        view = memoryview(buffer).cast("B")
+        head_size = len(self._head)
+        if self._position < head_size:
+            chunk = self._head[self._position : self._position + len(view)]
+        elif self._position < self._body_end:
+            self._handle.seek(self._position - head_size)
+            chunk = self._handle.read(min(len(view), self._body_end - self._position))
+        else:
+            offset = self._position - self._body_end
+            chunk = self._tail[offset : offset + len(view)]
+        view[: len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+
+def process_uploaded_file(payload: Tuple[str, BinaryIO, str], session: requests.Session) -> Dict[str, Any]:
+    name, handle, mime = payload
     endpoint = f"{API_BASE_URL}/upload/file"
     if name.lower().endswith(".zip"):
         endpoint = f"{API_BASE_URL}/upload/zip"
-    response = requests.post(endpoint, files={"file": (name, content, mime)}, timeout=300)
+    boundary = uuid.uuid4().hex
+    response = session.post(
+        endpoint,
+        data=_MultipartUpload(name, handle, mime, boundary),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        timeout=300,
+    )
     response.raise_for_status()
-    return response.json()
+    return orjson.loads(response.content)
+
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def _export_bytes(fmt: str, batch_key: str, index: int, _dataset: Dict[str, Any]) -> bytes:
+    # Keyed on the batch digest and report position, so downloading the same
+    # report again skips the backend render. Kept in memory only: fiscal
+    # exports are not written to Streamlit's disk cache. Failures, including
+    # empty bodies, raise and are not cached.
+    endpoint = EXPORT_ENDPOINTS[fmt][0]
+    with io.BytesIO() as buffer:
+        with _http().post(
+            f"{API_BASE_URL}/export/{endpoint}",
+            json={"dataset": _dataset},
+            timeout=120,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(EXPORT_CHUNK_BYTES):
+                buffer.write(chunk)
+        if not buffer.tell():
+            raise requests.RequestException("resposta vazia do servidor")
+        return buffer.getvalue()
 
 
-def _trigger_export(fmt: str, dataset: Dict[str, Any]) -> None:
+def _trigger_export(fmt: str, dataset: Dict[str, Any], batch_key: str, index: int) -> None:
     if fmt not in EXPORT_ENDPOINTS:
         _set_toast(f"Formato de exportação desconhecido: {fmt}")
         return
-    endpoint, mime, default_name = EXPORT_ENDPOINTS[fmt]
+    _, mime, default_name = EXPORT_ENDPOINTS[fmt]
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/export/{endpoint}",
-            json={"dataset": dataset},
-            timeout=120,
-        )
-        response.raise_for_status()
+        data = _export_bytes(fmt, batch_key, index, dataset)
     except requests.RequestException as exc:
         _set_toast(f"Falha ao exportar ({fmt.upper()}): {exc}")
         return
-    filename = dataset.get("title") or default_name
+    # Report titles carry no extension; borrow the format's own.
+    title = dataset.get("title")
+    filename = f"{title}{Path(default_name).suffix}" if title else default_name
     st.download_button(
         label=f"Baixar {fmt.upper()}",
-        data=response.content,
+        data=data,
         mime=mime,
-        file_name=filename if filename else default_name,
+        file_name=filename,
         key=f"download-{fmt}",
     )
 
@@ -125,12 +266,11 @@ def _init_session_state() -> None:
         "pipelineStep": "UPLOAD",
         "activeView": "report",
         "showLogs": False,
-        "upload_queue": [],
+        "upload_queue": {},
+        "upload_digests": {},
+        "processed_uploads": OrderedDict(),
         "analysis_results": [],
         "aggregated_overview": None,
-        "aggregated_totals": {},
-        "aggregated_docs": [],
-        "logs_payload": [],
         "agent_status": {step_id: "pending" for step_id, _ in AGENT_STEPS},
         "processing_status": "",
         "chat_messages": [dict(INITIAL_CHAT_MESSAGE)],
@@ -145,6 +285,161 @@ def _init_session_state() -> None:
 
 
 
+THEME_CSS_TEMPLATE = Template(
+    """
+    <style>
+        header, [data-testid="stSidebar"], [data-testid="collapsedControl"], [data-testid="stToolbar"] {
+            display: none !important;
+        }
+        body {
+            background: $background;
+            color: $text;
+            font-family: 'SF Pro Display', 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
+        }
+        [data-testid="stAppViewContainer"] > .main {
+            background: $background;
+        }
+        .block-container {
+            padding: 0 2rem 3.5rem;
+            max-width: 1100px;
+            margin: 0 auto;
+        }
+        .nxq-header {
+            display: flex;
+            align-items: flex-end;
+            justify-content: space-between;
+            padding: 32px 0 24px;
+            margin-bottom: 32px;
+            border-bottom: 1px solid rgba(255, 255, 255, 0.06);
+        }
+        .nxq-brand { display: flex; align-items: center; gap: 20px; }
+        .nxq-brand-logo {
+            width: 52px;
+            height: 52px;
+            border-radius: 20px;
+            border: 1px solid rgba(255, 255, 255, 0.08);
+            background: linear-gradient(155deg, rgba(10, 132, 255, 0.65), rgba(64, 255, 217, 0.4));
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            padding: 10px;
+            box-shadow: 0 18px 38px rgba(7, 16, 30, 0.55);
+        }
+        .nxq-brand-logo svg { width: 100%; height: 100%; }
+        .nxq-brand-title {
+            margin: 0;
+            font-size: 1.75rem;
+            font-weight: 700;
+            letter-spacing: -0.02em;
+            background: linear-gradient(98deg, rgba(255,255,255,0.96) 0%, rgba(175,229,255,0.9) 80%);
+            -webkit-background-clip: text;
+            -webkit-text-fill-color: transparent;
+        }
+        .nxq-brand-subtitle {
+            margin: 4px 0 0;
+            font-size: 0.92rem;
+            color: rgba(219, 229, 244, 0.7);
+        }
+        .nxq-header-actions { display: flex; align-items: center; gap: 10px; }
+        .nxq-header-actions .stButton button {
+            border-radius: 10px;
+            border: 1px solid rgba(255,255,255,0.08);
+            background: rgba(255,255,255,0.04);
+            color: rgba(236, 243, 255, 0.9);
+            font-weight: 500;
+            padding: 0.42rem 0.95rem;
+        }
+        .nxq-export-group { display: flex; gap: 6px; }
+        .nxq-export-group .stButton button {
+            width: 46px;
+            height: 46px;
+            border-radius: 12px;
+            border: 1px solid rgba(255,255,255,0.08);
+            background: rgba(10, 132, 255, 0.12);
+            color: rgba(223, 237, 255, 0.95);
+            font-weight: 600;
+            letter-spacing: 0.01em;
+        }
+        .nxq-upload-wrapper { display: flex; justify-content: center; margin-top: 18px; }
+        .nxq-upload-card {
+            max-width: 620px;
+            width: 100%;
+            background: rgba(20, 22, 30, 0.76);
+            border: 1px solid rgba(255,255,255,0.05);
+            border-radius: 24px;
+            padding: 32px 40px;
+            box-shadow: 0 32px 60px rgba(4, 8, 20, 0.55);
+            backdrop-filter: blur(18px);
+        }
+        .nxq-upload-title {
+            font-size: 0.95rem;
+            text-transform: uppercase;
+            font-weight: 600;
+            letter-spacing: 0.08em;
+            margin-bottom: 18px;
+            color: rgba(216, 225, 236, 0.78);
+        }
+        .nxq-dropzone {
+            border: 1px dashed rgba(148, 180, 215, 0.32);
+            border-radius: 20px;
+            background: rgba(21, 24, 32, 0.85);
+            padding: 52px 24px 44px;
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+            text-align: center;
+            gap: 10px;
+        }
+        .nxq-dropzone svg { display: none; }
+        .nxq-dropzone::before { content: "\u2191"; font-size: 2.6rem; color: rgba(175, 229, 255, 0.9); }
+        .nxq-dropzone::after { content: "Arraste arquivos ou clique para enviar"; color: rgba(223, 233, 244, 0.92); font-size: 1.02rem; font-weight: 600; }
+        .nxq-hint { margin-top: 14px; text-align: center; font-size: 0.85rem; color: rgba(190, 205, 228, 0.65); }
+        .nxq-demo-link .stButton button { background: none; border: none; color: rgba(128, 198, 255, 0.88); padding: 0; font-weight: 500; }
+        .nxq-upload-extras {
+            max-width: 620px;
+            margin: 24px auto 0;
+            background: rgba(18, 20, 27, 0.78);
+            border: 1px solid rgba(255,255,255,0.04);
+            border-radius: 20px;
+            padding: 20px 24px;
+            box-shadow: 0 22px 48px rgba(4, 8, 20, 0.45);
+        }
+        .nxq-upload-actions .stButton button { width: 100%; border-radius: 12px; padding: 0.75rem 1rem; font-weight: 600; }
+        .nxq-upload-actions .stButton:nth-child(1) button { background: linear-gradient(135deg, rgba(10,132,255,0.9), rgba(64,255,217,0.75)) !important; border: none !important; color: #041021 !important; }
+        .nxq-upload-actions .stButton:nth-child(2) button { background: rgba(29,32,40,0.85) !important; border: 1px solid rgba(255,255,255,0.08) !important; color: rgba(212,220,236,0.85) !important; }
+        .nxq-progress-steps { display: flex; align-items: center; gap: 12px; margin: 28px 0 14px; justify-content: space-between; }
+        .nxq-progress-step { display: flex; flex-direction: column; align-items: center; gap: 8px; flex: 1; }
+        .nxq-progress-node { width: 44px; height: 44px; border-radius: 14px; display: flex; align-items: center; justify-content: center; font-weight: 500; border: 1px solid rgba(255,255,255,0.08); background: rgba(26, 28, 36, 0.92); color: rgba(238, 244, 255, 0.8); }
+        .nxq-progress-node.running { border-color: rgba(10,132,255,0.6); color: rgba(173,215,255,0.95); }
+        .nxq-progress-node.completed { border-color: rgba(64,255,217,0.7); color: rgba(64,255,217,0.9); }
+        .nxq-progress-node.error { border-color: rgba(255,95,109,0.7); color: rgba(255,95,109,0.9); }
+        .nxq-progress-label { font-size: 0.78rem; text-align: center; color: rgba(203,210,224,0.75); }
+        .nxq-progress-connector { height: 1px; flex: 1; background: linear-gradient(90deg, rgba(255,255,255,0.08), rgba(255,255,255,0)); }
+        .nxq-view-switcher .stRadio > label { display: none; }
+        .nxq-view-switcher .st-bc { display: flex; gap: 10px; flex-wrap: wrap; }
+        .nxq-view-switcher [role="radiogroup"] > label { border-radius: 999px; padding: 0.45rem 1.4rem; border: 1px solid rgba(255,255,255,0.08); background: rgba(28, 30, 38, 0.9); font-weight: 500; color: rgba(220,226,236,0.9); }
+        .nxq-view-switcher [role="radiogroup"] > label:hover { border-color: rgba(10,132,255,0.5); }
+        .nxq-chat-panel { background: rgba(19, 21, 28, 0.82); border: 1px solid rgba(255,255,255,0.05); border-radius: 22px; padding: 1.4rem; box-shadow: 0 26px 50px rgba(4, 8, 20, 0.55); position: sticky; top: 6rem; }
+        .nxq-chat-messages { max-height: 420px; overflow-y: auto; margin-bottom: 1rem; padding-right: 6px; }
+        .nxq-chat-bubble { margin-bottom: 0.9rem; padding: 0.85rem 1.05rem; border-radius: 16px; line-height: 1.5; font-size: 0.94rem; }
+        .nxq-chat-bubble.ai { background: rgba(46, 50, 64, 0.88); border: 1px solid rgba(255,255,255,0.04); color: rgba(224, 232, 246, 0.9); }
+        .nxq-chat-bubble.user { background: rgba(10,132,255,0.15); border: 1px solid rgba(10,132,255,0.2); color: rgba(202, 231, 255, 0.92); }
+        .nxq-toast { position: fixed; right: 32px; bottom: 32px; background: rgba(24,27,34,0.96); border: 1px solid rgba(255,255,255,0.08); border-radius: 16px; padding: 0.85rem 1.1rem; display: flex; align-items: center; gap: 10px; box-shadow: 0 22px 38px rgba(3,10,28,0.45); z-index: 99; }
+        .nxq-logs-overlay { position: fixed; top: 84px; right: 44px; width: min(420px, 92vw); max-height: 72vh; overflow-y: auto; background: rgba(17,19,26,0.98); border: 1px solid rgba(255,255,255,0.07); border-radius: 20px; padding: 1.6rem; box-shadow: 0 28px 48px rgba(5,10,24,0.6); z-index: 120; }
+        .nxq-logs-entry { border-left: 3px solid rgba(10,132,255,0.45); padding: 0.6rem 0.8rem; margin-bottom: 0.6rem; background: rgba(24, 27, 36, 0.85); }
+        .nxq-logs-entry small { color: rgba(198,212,238,0.65); display: block; margin-bottom: 3px; }
+    </style>
+    """
+)
+
+
+@st.cache_resource(show_spinner=False)
+def _theme_css() -> str:
+    assets_path = Path(__file__).parent / "assets" / "theme.css"
+    asset_css = f"<style>{assets_path.read_text()}</style>" if assets_path.exists() else ""
+    return asset_css + THEME_CSS_TEMPLATE.substitute(background=BACKGROUND_COLOR, text=TEXT_COLOR)
+
+
 def _inject_theme() -> None:
     st.set_page_config(
         page_title="Nexus QuantumI2A2",
@@ -152,201 +447,106 @@ def _inject_theme() -> None:
         layout="wide",
         initial_sidebar_state="collapsed",
     )
-
-    assets_path = Path(__file__).parent / "assets" / "theme.css"
-    if assets_path.exists():
-        st.markdown(f"<style>{assets_path.read_text()}</style>", unsafe_allow_html=True)
-
-    css_template = Template(
-        """
-        <style>
-            header, [data-testid="stSidebar"], [data-testid="collapsedControl"], [data-testid="stToolbar"] {
-                display: none !important;
-            }
-            body {
-                background: $background;
-                color: $text;
-                font-family: 'SF Pro Display', 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-            }
-            [data-testid="stAppViewContainer"] > .main {
-                background: $background;
-            }
-            .block-container {
-                padding: 0 2rem 3.5rem;
-                max-width: 1100px;
-                margin: 0 auto;
-            }
-            .nxq-header {
-                display: flex;
-                align-items: flex-end;
-                justify-content: space-between;
-                padding: 32px 0 24px;
-                margin-bottom: 32px;
-                border-bottom: 1px solid rgba(255, 255, 255, 0.06);
-            }
-            .nxq-brand { display: flex; align-items: center; gap: 20px; }
-            .nxq-brand-logo {
-                width: 52px;
-                height: 52px;
-                border-radius: 20px;
-                border: 1px solid rgba(255, 255, 255, 0.08);
-                background: linear-gradient(155deg, rgba(10, 132, 255, 0.65), rgba(64, 255, 217, 0.4));
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                padding: 10px;
-                box-shadow: 0 18px 38px rgba(7, 16, 30, 0.55);
-            }
-            .nxq-brand-logo svg { width: 100%; height: 100%; }
-            .nxq-brand-title {
-                margin: 0;
-                font-size: 1.75rem;
-                font-weight: 700;
-                letter-spacing: -0.02em;
-                background: linear-gradient(98deg, rgba(255,255,255,0.96) 0%, rgba(175,229,255,0.9) 80%);
-                -webkit-background-clip: text;
-                -webkit-text-fill-color: transparent;
-            }
-            .nxq-brand-subtitle {
-                margin: 4px 0 0;
-                font-size: 0.92rem;
-                color: rgba(219, 229, 244, 0.7);
-            }
-            .nxq-header-actions { display: flex; align-items: center; gap: 10px; }
-            .nxq-header-actions .stButton button {
-                border-radius: 10px;
-                border: 1px solid rgba(255,255,255,0.08);
-                background: rgba(255,255,255,0.04);
-                color: rgba(236, 243, 255, 0.9);
-                font-weight: 500;
-                padding: 0.42rem 0.95rem;
-            }
-            .nxq-export-group { display: flex; gap: 6px; }
-            .nxq-export-group .stButton button {
-                width: 46px;
-                height: 46px;
-                border-radius: 12px;
-                border: 1px solid rgba(255,255,255,0.08);
-                background: rgba(10, 132, 255, 0.12);
-                color: rgba(223, 237, 255, 0.95);
-                font-weight: 600;
-                letter-spacing: 0.01em;
-            }
-            .nxq-upload-wrapper { display: flex; justify-content: center; margin-top: 18px; }
-            .nxq-upload-card {
-                max-width: 620px;
-                width: 100%;
-                background: rgba(20, 22, 30, 0.76);
-                border: 1px solid rgba(255,255,255,0.05);
-                border-radius: 24px;
-                padding: 32px 40px;
-                box-shadow: 0 32px 60px rgba(4, 8, 20, 0.55);
-                backdrop-filter: blur(18px);
-            }
-            .nxq-upload-title {
-                font-size: 0.95rem;
-                text-transform: uppercase;
-                font-weight: 600;
-                letter-spacing: 0.08em;
-                margin-bottom: 18px;
-                color: rgba(216, 225, 236, 0.78);
-            }
-            .nxq-dropzone {
-                border: 1px dashed rgba(148, 180, 215, 0.32);
-                border-radius: 20px;
-                background: rgba(21, 24, 32, 0.85);
-                padding: 52px 24px 44px;
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                text-align: center;
-                gap: 10px;
-            }
-            .nxq-dropzone svg { display: none; }
-            .nxq-dropzone::before { content: "\u2191"; font-size: 2.6rem; color: rgba(175, 229, 255, 0.9); }
-            .nxq-dropzone::after { content: "Arraste arquivos ou clique para enviar"; color: rgba(223, 233, 244, 0.92); font-size: 1.02rem; font-weight: 600; }
-            .nxq-hint { margin-top: 14px; text-align: center; font-size: 0.85rem; color: rgba(190, 205, 228, 0.65); }
-            .nxq-demo-link .stButton button { background: none; border: none; color: rgba(128, 198, 255, 0.88); padding: 0; font-weight: 500; }
-            .nxq-upload-extras {
-                max-width: 620px;
-                margin: 24px auto 0;
-                background: rgba(18, 20, 27, 0.78);
-                border: 1px solid rgba(255,255,255,0.04);
-                border-radius: 20px;
-                padding: 20px 24px;
-                box-shadow: 0 22px 48px rgba(4, 8, 20, 0.45);
-            }
-            .nxq-upload-actions .stButton button { width: 100%; border-radius: 12px; padding: 0.75rem 1rem; font-weight: 600; }
-            .nxq-upload-actions .stButton:nth-child(1) button { background: linear-gradient(135deg, rgba(10,132,255,0.9), rgba(64,255,217,0.75)) !important; border: none !important; color: #041021 !important; }
-            .nxq-upload-actions .stButton:nth-child(2) button { background: rgba(29,32,40,0.85) !important; border: 1px solid rgba(255,255,255,0.08) !important; color: rgba(212,220,236,0.85) !important; }
-            .nxq-progress-steps { display: flex; align-items: center; gap: 12px; margin: 28px 0 14px; justify-content: space-between; }
-            .nxq-progress-step { display: flex; flex-direction: column; align-items: center; gap: 8px; flex: 1; }
-            .nxq-progress-node { width: 44px; height: 44px; border-radius: 14px; display: flex; align-items: center; justify-content: center; font-weight: 500; border: 1px solid rgba(255,255,255,0.08); background: rgba(26, 28, 36, 0.92); color: rgba(238, 244, 255, 0.8); }
-            .nxq-progress-node.running { border-color: rgba(10,132,255,0.6); color: rgba(173,215,255,0.95); }
-            .nxq-progress-node.completed { border-color: rgba(64,255,217,0.7); color: rgba(64,255,217,0.9); }
-            .nxq-progress-node.error { border-color: rgba(255,95,109,0.7); color: rgba(255,95,109,0.9); }
-            .nxq-progress-label { font-size: 0.78rem; text-align: center; color: rgba(203,210,224,0.75); }
-            .nxq-progress-connector { height: 1px; flex: 1; background: linear-gradient(90deg, rgba(255,255,255,0.08), rgba(255,255,255,0)); }
-            .nxq-view-switcher .stRadio > label { display: none; }
-            .nxq-view-switcher .st-bc { display: flex; gap: 10px; flex-wrap: wrap; }
-            .nxq-view-switcher [role="radiogroup"] > label { border-radius: 999px; padding: 0.45rem 1.4rem; border: 1px solid rgba(255,255,255,0.08); background: rgba(28, 30, 38, 0.9); font-weight: 500; color: rgba(220,226,236,0.9); }
-            .nxq-view-switcher [role="radiogroup"] > label:hover { border-color: rgba(10,132,255,0.5); }
-            .nxq-chat-panel { background: rgba(19, 21, 28, 0.82); border: 1px solid rgba(255,255,255,0.05); border-radius: 22px; padding: 1.4rem; box-shadow: 0 26px 50px rgba(4, 8, 20, 0.55); position: sticky; top: 6rem; }
-            .nxq-chat-messages { max-height: 420px; overflow-y: auto; margin-bottom: 1rem; padding-right: 6px; }
-            .nxq-chat-bubble { margin-bottom: 0.9rem; padding: 0.85rem 1.05rem; border-radius: 16px; line-height: 1.5; font-size: 0.94rem; }
-            .nxq-chat-bubble.ai { background: rgba(46, 50, 64, 0.88); border: 1px solid rgba(255,255,255,0.04); color: rgba(224, 232, 246, 0.9); }
-            .nxq-chat-bubble.user { background: rgba(10,132,255,0.15); border: 1px solid rgba(10,132,255,0.2); color: rgba(202, 231, 255, 0.92); }
-            .nxq-toast { position: fixed; right: 32px; bottom: 32px; background: rgba(24,27,34,0.96); border: 1px solid rgba(255,255,255,0.08); border-radius: 16px; padding: 0.85rem 1.1rem; display: flex; align-items: center; gap: 10px; box-shadow: 0 22px 38px rgba(3,10,28,0.45); z-index: 99; }
-            .nxq-logs-overlay { position: fixed; top: 84px; right: 44px; width: min(420px, 92vw); max-height: 72vh; overflow-y: auto; background: rgba(17,19,26,0.98); border: 1px solid rgba(255,255,255,0.07); border-radius: 20px; padding: 1.6rem; box-shadow: 0 28px 48px rgba(5,10,24,0.6); z-index: 120; }
-            .nxq-logs-entry { border-left: 3px solid rgba(10,132,255,0.45); padding: 0.6rem 0.8rem; margin-bottom: 0.6rem; background: rgba(24, 27, 36, 0.85); }
-            .nxq-logs-entry small { color: rgba(198,212,238,0.65); display: block; margin-bottom: 3px; }
-        </style>
-        """
-    )
-
-    css = css_template.substitute(background=BACKGROUND_COLOR, text=TEXT_COLOR)
-    st.markdown(css, unsafe_allow_html=True)
+    st.markdown(_theme_css(), unsafe_allow_html=True)
 
 def _enqueue_files(files: Iterable["UploadedFile"]) -> Tuple[int, List[str]]:
     added = 0
     duplicates: List[str] = []
-    names = {entry["name"] for entry in st.session_state["upload_queue"]}
+    queue = st.session_state["upload_queue"]
+    digests = st.session_state["upload_digests"]
     for file in files:
-        if file.name in names:
+        # The uploader hands back the same files on every rerun; each one is
+        # hashed and queued only the first time its file_id shows up.
+        if file.file_id in digests:
+            continue
+        # Deduplicate on content, not name: renamed copies are skipped and
+        # distinct files sharing a name are both kept.
+        digest = hashlib.blake2b(file.getbuffer(), digest_size=16).hexdigest()
+        digests[file.file_id] = digest
+        if digest in queue:
             duplicates.append(file.name)
             continue
-        payload = _prepare_payload(file)
-        st.session_state["upload_queue"].append({"name": file.name, "size": getattr(file, "size", 0), "payload": payload})
-        names.add(file.name)
+        queue[digest] = {"name": file.name, "size": getattr(file, "size", 0), "digest": digest, "payload": _prepare_payload(file)}
         added += 1
     return added, duplicates
 
 
 def _clear_upload_queue() -> None:
-    st.session_state["upload_queue"] = []
+    _release_payloads(st.session_state["upload_queue"].values())
+    st.session_state["upload_queue"] = {}
 
 
 def _update_agent_status(status: str) -> None:
-    for key, _ in AGENT_STEPS:
-        st.session_state["agent_status"][key] = status
+    # One session-state lookup for the whole pipeline, not one per step.
+    st.session_state["agent_status"].update((key, status) for key, _ in AGENT_STEPS)
+
+
+def _totals_from_sums(vprod: float, vicms: float, vpis: float, vcofins: float) -> Dict[str, float]:
+    return {"vNF": vprod, "vProd": vprod, "vICMS": vicms, "vPIS": vpis, "vCOFINS": vcofins}
 
 
-def _aggregate_local(results: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
-    totals = {"vNF": 0.0, "vProd": 0.0, "vICMS": 0.0, "vPIS": 0.0, "vCOFINS": 0.0}
-    docs: List[Dict[str, Any]] = []
+def _as_float_array(values: List[Any]) -> np.ndarray:
+    """Coerce backend numbers to float64; unparseable values count as zero."""
+    import numpy as np
+    import pandas as pd
+
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+
+def _aggregate_local(batch_key: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Walk the results once, collecting reports, logs, per-document rows and totals.
+
+    Runs once per batch, from ``_run_pipeline``; the overview it returns is
+    stored in session state, and ``batch_key`` travels with it to key the
+    cached views built from it.
+    ``result_totals`` holds the same totals broken down per result, in order.
+    """
+    import numpy as np
+
+    reports: List[Dict[str, Any]] = []
+    logs: List[Dict[str, Any]] = []
+    valores: List[Any] = []
+    contagens: List[int] = []
+    resumos: List[List[Any]] = []
+    relatorios_por_resultado: List[int] = []
     for result in results:
-        for report in result.get("reports", []):
-            source = report.get("source") or {}
-            itens = source.get("itens") or []
-            valor_produtos = sum(float(item.get("valor") or 0) for item in itens)
+        logs.extend(result.get("logs") or [])
+        result_reports = result.get("reports") or []
+        relatorios_por_resultado.append(len(result_reports))
+        reports.extend(result_reports)
+        # Missing and falsy values need no "or 0": _as_float_array zeroes
+        # anything that does not parse.
+        for report in result_reports:
+            itens = (report.get("source") or {}).get("itens") or []
+            valores.extend(item.get("valor") for item in itens)
+            contagens.append(len(itens))
             resumo = (report.get("taxes") or {}).get("resumo") or {}
-            totals["vProd"] += valor_produtos
-            totals["vNF"] += valor_produtos
-            totals["vICMS"] += float(resumo.get("totalICMS") or 0)
-            totals["vPIS"] += float(resumo.get("totalPIS") or 0)
-            totals["vCOFINS"] += float(resumo.get("totalCOFINS") or 0)
-            docs.append({"Documento": report.get("title"), "Valor dos Produtos": valor_produtos, "Score": (report.get("compliance") or {}).get("score")})
-    return {"totals": totals, "docs": docs}
+            resumos.append([resumo.get(field) for field in TAX_SUMMARY_FIELDS])
+    # Item owners are expanded in C from the per-report counts.
+    owners = np.repeat(np.arange(len(reports), dtype=np.intp), contagens)
+    valores_produtos = np.bincount(owners, weights=_as_float_array(valores), minlength=len(reports))
+    impostos = _as_float_array([value for resumo in resumos for value in resumo]).reshape(len(reports), len(TAX_SUMMARY_FIELDS))
+    por_documento = np.column_stack((valores_produtos, impostos))
+    por_resultado = np.zeros((len(results), por_documento.shape[1]), dtype=np.float64)
+    np.add.at(por_resultado, np.repeat(np.arange(len(results), dtype=np.intp), relatorios_por_resultado), por_documento)
+    totals = _totals_from_sums(*por_documento.sum(axis=0).tolist())
+    result_totals = [_totals_from_sums(*row) for row in por_resultado.tolist()]
+    # Columnar rows: the dashboard frame wraps these arrays without copying.
+    docs = {
+        "Documento": [report.get("title") for report in reports],
+        "Valor dos Produtos": valores_produtos,
+        "Score": [(report.get("compliance") or {}).get("score") for report in reports],
+    }
+    # The overlay only ever shows the tail; keep the session copy bounded.
+    logs = logs[-LOGS_DISPLAY_LIMIT:]
+    return {
+        "key": batch_key,
+        "reports": reports,
+        "docs": docs,
+        "totals": totals,
+        "logs": logs,
+        "result_totals": result_totals,
+    }
 
 
 def _process_queue() -> None:
@@ -356,111 +556,150 @@ def _process_queue() -> None:
     st.session_state["pipelineStep"] = "PROCESSING"
     st.session_state["processing_status"] = "Iniciando pipeline"
     _update_agent_status("pending")
+    # Runs as an on_click callback, so the rerun that follows the click
+    # already renders the processing view.
     st.session_state.pop("_processing_started", None)
-    st.experimental_rerun()
 
 
-def _run_pipeline() -> None:
-    queue = list(st.session_state.get("upload_queue") or [])
+def _run_pipeline(progress: Optional["DeltaGenerator"] = None) -> None:
+    queue = list((st.session_state.get("upload_queue") or {}).values())
     if not queue:
         st.session_state["pipelineStep"] = "UPLOAD"
         st.experimental_rerun()
         return
     results: List[Dict[str, Any]] = []
-    logs: List[Dict[str, Any]] = []
     errors: List[str] = []
-    for index, entry in enumerate(queue, start=1):
-        name = entry["name"]
-        payload = entry["payload"]
-        st.session_state["processing_status"] = f"Processando {index}/{len(queue)}: {name}"
-        for step_id, _ in AGENT_STEPS:
-            st.session_state["agent_status"][step_id] = "running"
-        try:
-            raw_result = process_uploaded_file(payload)
-            results.append(raw_result)
-            logs.extend(raw_result.get("logs") or [])
-            for step_id, _ in AGENT_STEPS:
-                st.session_state["agent_status"][step_id] = "completed"
-        except Exception as exc:
-            errors.append(f"{name}: {exc}")
-            for step_id, _ in AGENT_STEPS:
-                st.session_state["agent_status"][step_id] = "error"
-    st.session_state["analysis_results"] = results
-    st.session_state["logs_payload"] = logs
-    backend_aggregated = {}
-    if results and isinstance(results[-1], dict):
-        backend_aggregated = results[-1].get("aggregated") or {}
-    aggregated = backend_aggregated or _aggregate_local(results)
-    st.session_state["aggregated_overview"] = {
-        "reports": [r for result in results for r in result.get("reports", [])],
-        "docs": aggregated.get("docs", []),
-        "totals": aggregated.get("totals", {}),
-        "logs": logs,
-    }
-    st.session_state["aggregated_totals"] = aggregated.get("totals", {})
-    st.session_state["aggregated_docs"] = aggregated.get("docs", [])
-    st.session_state["upload_queue"] = []
+    st.session_state["processing_status"] = f"Processando {len(queue)} arquivo(s)"
+    _update_agent_status("running")
+    # Files this session already analysed are reused; results never cross
+    # sessions. The name is part of the key because it ends up in the
+    # report titles.
+    processed = st.session_state["processed_uploads"]
+    keys = [(entry["name"], entry["digest"]) for entry in queue]
+    outcomes: List[Any] = [processed.get(key) for key in keys]
+    for key, outcome in zip(keys, outcomes):
+        if outcome is not None:
+            processed.move_to_end(key)
+    pending = [position for position, outcome in enumerate(outcomes) if outcome is None]
+    # Uploads are network-bound, so they overlap in worker threads; session
+    # state is only touched from the script thread once each future resolves.
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(pending))) as executor:
+            # Resolved here: cache_resource lookups need the script thread's
+            # run context, which worker threads do not have.
+            session = _http()
+            futures = {executor.submit(process_uploaded_file, queue[position]["payload"], session): position for position in pending}
+            last_update = time.monotonic()
+            for done, future in enumerate(as_completed(futures), start=1):
+                position = futures[future]
+                try:
+                    outcomes[position] = future.result()
+                except Exception as exc:
+                    outcomes[position] = exc
+                else:
+                    processed[keys[position]] = outcomes[position]
+                    while len(processed) > PROCESSED_UPLOADS_LIMIT:
+                        processed.popitem(last=False)
+                # Each progress write is a websocket frame; coalesce them.
+                now = time.monotonic()
+                if progress is not None and (done == len(futures) or now - last_update > PROGRESS_REFRESH_SECONDS):
+                    progress.progress(done / len(futures), text=f"{done}/{len(futures)} arquivo(s) processado(s)")
+                    last_update = now
+    names: List[str] = []
+    for entry, outcome in zip(queue, outcomes):
+        if isinstance(outcome, Exception):
+            errors.append(f"{entry['name']}: {outcome}")
+        else:
+            results.append(outcome)
+            names.append(entry["name"])
+    _release_payloads(queue)
+    _update_agent_status("error" if errors else "completed")
+    # Totals are always folded locally: each /upload/* response only
+    # aggregates its own file, so no single backend payload covers the batch.
+    # One digest per batch keys the cached views (reports JSON, dashboard
+    # frame, logs, exports), so Streamlit never deep-hashes the reports on
+    # later reruns. The aggregation itself runs only here, once per batch.
+    batch_key = hashlib.blake2b(orjson.dumps(results, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+    aggregated = _aggregate_local(batch_key, results)
+    # Per-file totals for the incremental insights come from the same pass.
+    st.session_state["analysis_results"] = [
+        {**result, "source": name, "totals": totals}
+        for result, name, totals in zip(results, names, aggregated.pop("result_totals"))
+    ]
+    st.session_state["aggregated_overview"] = aggregated
+    st.session_state["upload_queue"] = {}
     if errors:
         st.session_state["pipelineStep"] = "ERROR"
         st.session_state["processing_status"] = "\n".join(errors)
     else:
         st.session_state["pipelineStep"] = "COMPLETE"
-        st.session_state["analysis_history"].append(aggregated)
+        st.session_state["analysis_history"].append({"totals": aggregated["totals"], "docs": aggregated["docs"]})
     st.experimental_rerun()
 
 
-def render_header() -> None:
-    show_exports = st.session_state["pipelineStep"] == "COMPLETE" and bool(st.session_state.get("aggregated_overview"))
-    st.markdown("<div class='nxq-header'>", unsafe_allow_html=True)
-    brand_html = """
-        <div class='nxq-brand'>
-            <div class='nxq-brand-logo'>
-                <svg viewBox="0 0 36 36" fill="none" xmlns="http://www.w3.org/2000/svg">
-                    <defs>
-                        <linearGradient id="nxq-logo-gradient" x1="4" y1="4" x2="32" y2="32" gradientUnits="userSpaceOnUse">
-                            <stop stop-color="#60a5fa"/>
-                            <stop offset="1" stop-color="#38bdf8"/>
-                        </linearGradient>
-                    </defs>
-                    <path d="M8 28V8L18 18L28 8V28" stroke="url(#nxq-logo-gradient)" stroke-width="3.5" stroke-linecap="round" stroke-linejoin="round"/>
-                    <path d="M8 28L18 18L28 28" stroke="url(#nxq-logo-gradient)" stroke-width="3.5" stroke-linecap="round" stroke-linejoin="round" opacity="0.6"/>
-                </svg>
-            </div>
-            <div>
-                <h1 class='nxq-brand-title'>Nexus QuantumI2A2</h1>
-                <p class='nxq-brand-subtitle'>Interactive Insight & Intelligence from Fiscal Analysis</p>
-            </div>
+# Static markup is emitted in as few st.markdown calls as possible: each
+# call is its own delta on the websocket on every rerun.
+BRAND_HTML = """
+    <div class='nxq-header'>
+    <div class='nxq-brand'>
+        <div class='nxq-brand-logo'>
+            <svg viewBox="0 0 36 36" fill="none" xmlns="http://www.w3.org/2000/svg">
+                <defs>
+                    <linearGradient id="nxq-logo-gradient" x1="4" y1="4" x2="32" y2="32" gradientUnits="userSpaceOnUse">
+                        <stop stop-color="#60a5fa"/>
+                        <stop offset="1" stop-color="#38bdf8"/>
+                    </linearGradient>
+                </defs>
+                <path d="M8 28V8L18 18L28 8V28" stroke="url(#nxq-logo-gradient)" stroke-width="3.5" stroke-linecap="round" stroke-linejoin="round"/>
+                <path d="M8 28L18 18L28 28" stroke="url(#nxq-logo-gradient)" stroke-width="3.5" stroke-linecap="round" stroke-linejoin="round" opacity="0.6"/>
+            </svg>
         </div>
-    """
-    st.markdown(brand_html, unsafe_allow_html=True)
+        <div>
+            <h1 class='nxq-brand-title'>Nexus QuantumI2A2</h1>
+            <p class='nxq-brand-subtitle'>Interactive Insight & Intelligence from Fiscal Analysis</p>
+        </div>
+    </div>
+"""
+
+
+def render_header() -> None:
+    overview = st.session_state.get("aggregated_overview")
+    show_exports = st.session_state["pipelineStep"] == "COMPLETE" and bool(overview)
+    st.markdown(BRAND_HTML, unsafe_allow_html=True)
     actions = st.container()
     with actions:
         st.markdown("<div class='nxq-header-actions'>", unsafe_allow_html=True)
         if show_exports:
-            reports = st.session_state.get("aggregated_overview", {}).get("reports") or []
+            reports = overview.get("reports") or []
             if reports:
                 col_select, col_buttons = st.columns([2, 3], gap="small")
-                labels = [r.get("title") or f"Documento {i+1}" for i, r in enumerate(reports)]
+                labels = [report.get("title") or f"Documento {index}" for index, report in enumerate(reports, start=1)]
                 with col_select:
-                    selection = st.selectbox(
+                    # Options are positions, so no label lookup on the way back
+                    # and repeated titles still select the right report.
+                    selected = st.selectbox(
                         "Documento para exportar",
-                        labels,
+                        range(len(labels)),
                         index=min(st.session_state.get("selected_export_index", 0), len(labels) - 1),
+                        format_func=labels.__getitem__,
                         label_visibility="hidden",
                         key="export-selector",
                     )
-                    st.session_state["selected_export_index"] = labels.index(selection)
+                    st.session_state["selected_export_index"] = selected
                 with col_buttons:
                     st.markdown("<div class='nxq-export-group'>", unsafe_allow_html=True)
-                    dataset = reports[st.session_state["selected_export_index"]]
+                    dataset = reports[selected]
                     cols = st.columns(4)
                     for fmt, col in zip(["pdf", "docx", "html", "md"], cols):
                         with col:
                             if st.button(fmt.upper(), key=f"export-{fmt}"):
-                                _trigger_export(fmt, dataset)
+                                _trigger_export(fmt, dataset, overview.get("key", ""), selected)
                     st.markdown("</div>", unsafe_allow_html=True)
                     if st.button("SPED", key="export-sped"):
-                        _trigger_export("sped", dataset)
+                        _trigger_export("sped", dataset, overview.get("key", ""), selected)
+                    # Every format in one archive, from a single backend request.
+                    if st.button("ZIP", key="export-zip"):
+                        _trigger_export("zip", dataset, overview.get("key", ""), selected)
         if st.button("Logs", key="toggle-logs"):
             st.session_state["showLogs"] = not st.session_state.get("showLogs")
         st.markdown("</div>", unsafe_allow_html=True)
@@ -480,31 +719,51 @@ def render_toast() -> None:
     st.session_state["toast"] = None
 
 
+@st.cache_data(show_spinner=False, max_entries=8)
+def _logs_html(batch_key: str, _logs: List[Dict[str, Any]]) -> str:
+    # One markdown element for the whole overlay instead of one per entry.
+    blocks: List[str] = []
+    for entry in _logs:
+        stamp = entry.get("timestamp") or entry.get("time") or "--"
+        level = entry.get("level") or entry.get("levelname") or "INFO"
+        message = entry.get("message") or entry.get("msg") or ""
+        agent = entry.get("agent") or entry.get("stage") or "pipeline"
+        blocks.append(
+            f"<div class='nxq-logs-entry'><small>[{html.escape(str(level))}] [{html.escape(str(agent))}] "
+            f"{html.escape(str(stamp))}</small><div>{html.escape(str(message))}</div></div>"
+        )
+    return "".join(blocks)
+
+
 def render_logs_overlay() -> None:
     if not st.session_state.get("showLogs"):
         return
-    logs = st.session_state.get("logs_payload") or []
+    overview = st.session_state.get("aggregated_overview") or {}
+    logs = overview.get("logs") or []
     st.markdown("<div class='nxq-logs-overlay'>", unsafe_allow_html=True)
     st.markdown("### Logs de Execução")
     if not logs:
         st.info("Nenhum log disponível.")
     else:
-        for entry in logs[-200:]:
-            stamp = entry.get("timestamp") or entry.get("time") or "--"
-            level = entry.get("level") or entry.get("levelname") or "INFO"
-            message = entry.get("message") or entry.get("msg") or ""
-            agent = entry.get("agent") or entry.get("stage") or "pipeline"
-            block = f"""<div class='nxq-logs-entry'><small>[{level}] [{agent}] {stamp}</small><div>{html.escape(str(message))}</div></div>"""
-            st.markdown(block, unsafe_allow_html=True)
+        st.markdown(_logs_html(overview.get("key", ""), logs), unsafe_allow_html=True)
     if st.button("Fechar", key="close-logs"):
         st.session_state["showLogs"] = False
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+UPLOAD_CARD_HTML = (
+    "<div class='nxq-upload-wrapper'><div class='nxq-upload-card'>"
+    "<div class='nxq-upload-title'>1. Upload de Arquivos</div>"
+)
+UPLOAD_HINT_HTML = (
+    "<p class='nxq-hint'>Suportados: XML, CSV, XLSX, PDF, Imagens (PNG, JPG), ZIP (limite de 200 MB)</p>"
+    "</div></div><div class='nxq-demo-link'>"
+)
+
+
 def render_upload_view() -> None:
     render_header()
-    st.markdown("<div class='nxq-upload-wrapper'><div class='nxq-upload-card'>", unsafe_allow_html=True)
-    st.markdown("<div class='nxq-upload-title'>1. Upload de Arquivos</div>", unsafe_allow_html=True)
+    st.markdown(UPLOAD_CARD_HTML, unsafe_allow_html=True)
     files = st.file_uploader(
         "Selecione arquivos",
         type=["xml", "csv", "xlsx", "pdf", "png", "jpeg", "jpg", "zip"],
@@ -518,20 +777,19 @@ def render_upload_view() -> None:
             _set_toast(f"{added} arquivo(s) adicionados à fila.", level="info")
         if duplicates:
             _set_toast("Arquivos ignorados: " + ", ".join(duplicates), level="info")
-    st.markdown(
-        "<p class='nxq-hint'>Suportados: XML, CSV, XLSX, PDF, Imagens (PNG, JPG), ZIP (limite de 200 MB)</p>",
-        unsafe_allow_html=True,
-    )
-    st.markdown("</div></div>", unsafe_allow_html=True)
-    st.markdown("<div class='nxq-demo-link'>", unsafe_allow_html=True)
+    st.markdown(UPLOAD_HINT_HTML, unsafe_allow_html=True)
     if st.button("Use um exemplo de demonstração", key="demo-button"):
         _set_toast("Modo demonstração indisponível no momento.", level="info")
     st.markdown("</div>", unsafe_allow_html=True)
-    queue = st.session_state.get("upload_queue") or []
+    queue = st.session_state.get("upload_queue") or {}
     if queue:
         st.markdown("<div class='nxq-upload-extras'>", unsafe_allow_html=True)
         st.markdown("#### Arquivos na fila")
-        df = pd.DataFrame([{ "Nome do arquivo": item["name"], "Tamanho": _format_file_size(item["size"])} for item in queue])
+        import pandas as pd
+
+        df = pd.DataFrame.from_records(list(queue.values()), columns=["name", "size"])
+        df["size"] = format_file_size_series(df["size"].fillna(0))
+        df.columns = ["Nome do arquivo", "Tamanho"]
         st.dataframe(df, use_container_width=True, hide_index=True)
         st.markdown("<div class='nxq-upload-actions'>", unsafe_allow_html=True)
         col1, col2 = st.columns(2, gap="large")
@@ -539,27 +797,33 @@ def render_upload_view() -> None:
             st.button(f"Analisar {len(queue)} arquivo(s)", on_click=_process_queue, use_container_width=True)
         with col2:
             st.button("Limpar fila", on_click=_clear_upload_queue, use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
-        st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown("</div></div>", unsafe_allow_html=True)
 
 
 def render_processing_view() -> None:
     render_header()
     status = st.session_state.get("processing_status") or "Aguardando"
-    st.write(f"#### {status}")
-    st.markdown("<div class='nxq-progress-steps'>", unsafe_allow_html=True)
+    agent_status = st.session_state["agent_status"]
+    steps = []
     for idx, (step_id, label) in enumerate(AGENT_STEPS):
-        step_state = st.session_state["agent_status"].get(step_id, "pending")
+        step_state = agent_status.get(step_id, "pending")
         node = "✓" if step_state == "completed" else str(idx + 1)
-        html_block = f"<div class='nxq-progress-step'><div class='nxq-progress-node {step_state}'>{node}</div><div class='nxq-progress-label'>{label}</div></div>"
-        st.markdown(html_block, unsafe_allow_html=True)
-        if idx < len(AGENT_STEPS) - 1:
-            st.markdown("<div class='nxq-progress-connector'></div>", unsafe_allow_html=True)
-    st.markdown("</div>", unsafe_allow_html=True)
-    st.progress(0.5)
+        steps.append(PROGRESS_STEP_TEMPLATE % (step_state, node, label))
+    # Status line and steps share one delta; the bar below is the only
+    # element that changes while the batch runs.
+    st.markdown(
+        f"#### {status}\n\n<div class='nxq-progress-steps'>" + PROGRESS_CONNECTOR.join(steps) + "</div>",
+        unsafe_allow_html=True,
+    )
+    progress = st.progress(0.0)
     if not st.session_state.get("_processing_started"):
         st.session_state["_processing_started"] = True
-        _run_pipeline()
+        _run_pipeline(progress)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _reports_json(batch_key: str, _reports: List[Dict[str, Any]]) -> List[str]:
+    return [orjson.dumps(report, option=orjson.OPT_INDENT_2).decode() for report in _reports]
 
 
 def _render_report_tab(aggregated: Dict[str, Any]) -> None:
@@ -568,29 +832,50 @@ def _render_report_tab(aggregated: Dict[str, Any]) -> None:
     if not reports:
         st.info("Nenhum relatório disponível.")
         return
-    for idx, report in enumerate(reports, start=1):
+    # Serialized once per batch; view switches reuse the cached strings.
+    for idx, (report, payload) in enumerate(zip(reports, _reports_json(aggregated.get("key", ""), reports)), start=1):
         with st.expander(report.get("title") or f"Documento {idx}", expanded=idx == 1):
-            st.json(report)
+            st.code(payload, language="json")
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _dashboard_frame(batch_key: str, _docs: Dict[str, Any]) -> pd.DataFrame:
+    import pandas as pd
+
+    df = pd.DataFrame(_docs, columns=DASHBOARD_COLUMNS, copy=False)
+    if not df.empty:
+        df["Valor dos Produtos"] = format_brl_series(df["Valor dos Produtos"])
+        # Kept numeric so the table sorts by value; missing scores stay empty.
+        df["Score"] = pd.to_numeric(df["Score"], errors="coerce")
+    return df
 
 
 def _render_dashboard_tab(aggregated: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
     display_summary(aggregated)
-    docs = aggregated.get("docs") or []
-    if docs:
-        df = pd.DataFrame(docs)
-        df["Valor dos Produtos"] = df["Valor dos Produtos"].map(_format_brl)
-        st.dataframe(df, use_container_width=True, hide_index=True)
+    df = _dashboard_frame(aggregated.get("key", ""), aggregated.get("docs") or {})
+    if not df.empty:
+        st.dataframe(
+            df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={"Score": st.column_config.NumberColumn(format="%.2f")},
+        )
     else:
         st.info("Envie arquivos para gerar métricas.")
     totals = aggregated.get("totals") or {}
-    base_icms = float(totals.get("vICMS") or 0.0)
+    _icms_simulator(float(totals.get("vICMS") or 0.0))
+    show_incremental_insights(results)
+
+
+@st.fragment
+def _icms_simulator(base_icms: float) -> None:
+    # Slider ticks rerun only this block, not the header, tabs and chat.
     col_slider, col_metric = st.columns([2, 1])
     with col_slider:
         aliquot = st.slider("Alíquota de ICMS Simulado (%)", 0.0, 30.0, 18.0, 0.5, key="icms-slider")
     with col_metric:
         simulated = base_icms * (aliquot / 18.0) if base_icms else 0.0
-        st.metric("ICMS Simulado", _format_brl(simulated), delta=_format_brl(simulated - base_icms))
-    show_incremental_insights(results)
+        st.metric("ICMS Simulado", format_brl(simulated), delta=format_brl(simulated - base_icms))
 
 
 def _render_comparative_tab(results: List[Dict[str, Any]]) -> None:
@@ -635,26 +920,33 @@ def render_complete_view() -> None:
         render_chat_panel()
 
 
+def _retry_analysis() -> None:
+    st.session_state["pipelineStep"] = "UPLOAD"
+    _clear_analysis_state()
+
+
 def render_error_view() -> None:
     render_header()
     st.error("Falha na análise")
     st.write(st.session_state.get("processing_status") or "O pipeline encontrou uma falha.")
-    if st.button("Tentar Novamente"):
-        st.session_state["pipelineStep"] = "UPLOAD"
-        _clear_analysis_state()
-        st.experimental_rerun()
+    st.button("Tentar Novamente", on_click=_retry_analysis)
 
 
+def _render_chat_history(messages: List[Dict[str, Any]]) -> str:
+    bubbles: List[Optional[str]] = [None] * len(messages)
+    for index, message in enumerate(messages):
+        role = CHAT_ROLE_CLASSES.get(message.get("sender"), "ai")
+        bubbles[index] = CHAT_BUBBLE_TEMPLATE % (role, message.get("text", "").translate(CHAT_HTML_ESCAPES))
+    return "<div class='nxq-chat-messages'>" + "".join(bubbles) + "</div>"
+
+
+@st.fragment
 def render_chat_panel() -> None:
     st.markdown("<div class='nxq-chat-panel'>", unsafe_allow_html=True)
     st.markdown("### 3. Chat Interativo")
-    messages = st.session_state.get("chat_messages", [])
-    st.markdown("<div class='nxq-chat-messages'>", unsafe_allow_html=True)
-    for message in messages:
-        bubble_class = "ai" if message.get("sender") != "user" else "user"
-        safe_text = html.escape(message.get("text", "")).replace("\n", "<br>")
-        st.markdown(f"<div class='nxq-chat-bubble {bubble_class}'>{safe_text}</div>", unsafe_allow_html=True)
-    st.markdown("</div>", unsafe_allow_html=True)
+    # The history is filled in after the form so a new message shows up
+    # without another pass over the panel.
+    history = st.empty()
     with st.form("chat-form", clear_on_submit=True):
         cols = st.columns([1, 6, 1, 1])
         with cols[0]:
@@ -671,26 +963,34 @@ def render_chat_panel() -> None:
             send = st.form_submit_button("Enviar", use_container_width=True)
         with cols[3]:
             st.form_submit_button("Parar", disabled=not st.session_state.get("chat_streaming"))
+    messages = st.session_state.get("chat_messages", [])
+    if send and prompt.strip():
+        messages.append({"id": f"user-{len(messages)}", "sender": "user", "text": prompt})
+        messages.append({"id": f"ai-{len(messages)}", "sender": "ai", "text": "Esta é uma resposta estática de exemplo. Integre a IA para respostas dinâmicas."})
+    # Reruns that leave the conversation untouched reuse the rendered HTML.
+    signature = hash(tuple((message.get("sender"), message.get("text", "")) for message in messages))
+    cached = st.session_state.get("_chat_history_html")
+    if cached is None or cached[0] != signature:
+        cached = (signature, _render_chat_history(messages))
+        st.session_state["_chat_history_html"] = cached
+    history.markdown(cached[1], unsafe_allow_html=True)
+    st.markdown("</div>", unsafe_allow_html=True)
     if attachments:
         added, duplicates = _enqueue_files(attachments)
         if added:
             _set_toast(f"{added} arquivo(s) adicionados à fila. Volte ao upload para reprocessar.", level="info")
         if duplicates:
             _set_toast("Arquivos ignorados: " + ", ".join(duplicates), level="info")
-    if send and prompt.strip():
-        st.session_state["chat_messages"].append({"id": f"user-{len(messages)}", "sender": "user", "text": prompt})
-        st.session_state["chat_messages"].append({"id": f"ai-{len(messages)+1}", "sender": "ai", "text": "Esta é uma resposta estática de exemplo. Integre a IA para respostas dinâmicas."})
+        # Toasts and the queue live outside this fragment.
         st.experimental_rerun()
-    st.markdown("</div>", unsafe_allow_html=True)
 
 
 def display_summary(aggregated: Dict[str, Any]) -> None:
     totals = aggregated.get("totals", {})
-    docs = aggregated.get("docs", [])
     metrics = [
-        ("Documentos", f"{len(docs)}"),
-        ("Valor Total dos Produtos", _format_brl(totals.get("vProd", 0.0))),
-        ("ICMS Estimado", _format_brl(totals.get("vICMS", 0.0))),
+        ("Documentos", f"{len(aggregated.get('reports') or [])}"),
+        ("Valor Total dos Produtos", format_brl(totals.get("vProd", 0.0))),
+        ("ICMS Estimado", format_brl(totals.get("vICMS", 0.0))),
     ]
     cols = st.columns(len(metrics))
     for col, (label, value) in zip(cols, metrics):
@@ -717,7 +1017,7 @@ def main() -> None:
         render_error_view()
     else:
         st.session_state["pipelineStep"] = "UPLOAD"
-        st.experimental_rerun()
+        render_upload_view()
 
 
 main()
@@ -0,0 +1,19 @@
+import pandas as pd
+
+from frontend.utils.formatting import format_brl, format_brl_series
+
+
+def test_format_brl_negative_zero_does_not_leak_into_zero():
+    assert format_brl(-0.001) == "R$ 0,00"
+    assert format_brl(0.0) == "R$ 0,00"
+    assert format_brl(-0.0) == "R$ 0,00"
+
+
+def test_format_brl_uses_brazilian_separators():
+    assert format_brl(1234567.891) == "R$ 1.234.567,89"
+    assert format_brl(-10.5) == "R$ -10,50"
+
+
+def test_format_brl_series_matches_scalar_formatter():
+    values = pd.Series([0.0, -0.0, -0.004, 1050.5, -2.0])
+    assert format_brl_series(values).tolist() == [format_brl(value) for value in values]
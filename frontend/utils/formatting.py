@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pandas as pd
+
+# Streamlit re-executes app.py on every rerun; keeping the formatters in an
+# imported module lets their caches survive across reruns.
+BRL_SEPARATORS = str.maketrans({",": ".", ".": ","})
+
+
+@lru_cache(maxsize=4096)
+def _brl(value: float) -> str:
+    return f"R$ {value:,.2f}".translate(BRL_SEPARATORS)
+
+
+def format_brl(value: float) -> str:
+    # Adding 0.0 folds -0.0 into 0.0: the two compare equal, so the shared
+    # cache would otherwise serve "R$ -0,00" for a plain zero.
+    return _brl(round(float(value), 2) + 0.0)
+
+
+def format_brl_series(values: pd.Series) -> pd.Series:
+    return (values.round(2) + 0.0).map("R$ {:,.2f}".format).str.translate(BRL_SEPARATORS)
+
+
+def format_file_size_series(sizes: pd.Series) -> pd.Series:
+    return sizes.astype("float64").div(1024).map("{:.1f} KB".format)
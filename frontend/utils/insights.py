@@ -2,19 +2,14 @@ from __future__ import annotations
 
 from typing import Any, Dict, Iterable, List, Optional
 
-import pandas as pd
+import orjson
 import streamlit as st
 
+from .formatting import format_brl, format_brl_series
 
-def _to_float(value: Any) -> float:
-    try:
-        return float(value or 0)
-    except (TypeError, ValueError):  # pragma: no cover - defensive
-        return 0.0
 
-
-def _format_currency(value: float) -> str:
-    return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+TOTAL_COLUMNS = {"vNF": "Total NF", "vProd": "Produtos", "vICMS": "ICMS"}
+DISCREPANCIES_LIMIT = 200
 
 
 def show_incremental_insights(results: Iterable[Dict[str, Any]]) -> None:
@@ -23,43 +18,47 @@ def show_incremental_insights(results: Iterable[Dict[str, Any]]) -> None:
         st.info("Nenhum resultado incremental disponível até o momento.")
         return
 
-    rows = []
-    for index, result in enumerate(results_list, start=1):
-        totals = result.get("totals") or {}
-        rows.append(
-            {
-                "Arquivo": result.get("source") or f"Upload {index}",
-                "Total NF": _to_float(totals.get("vNF")),
-                "Produtos": _to_float(totals.get("vProd")),
-                "ICMS": _to_float(totals.get("vICMS")),
-            }
-        )
+    import pandas as pd
 
-    df = pd.DataFrame(rows)
+    totals = pd.DataFrame.from_records(
+        [result.get("totals") or {} for result in results_list], columns=list(TOTAL_COLUMNS)
+    )
+    df = totals.apply(pd.to_numeric, errors="coerce").fillna(0.0).rename(columns=TOTAL_COLUMNS)
+    df.insert(
+        0,
+        "Arquivo",
+        [result.get("source") or f"Upload {index}" for index, result in enumerate(results_list, start=1)],
+    )
 
     st.subheader("📊 Insights Individuais e Comparativos")
 
     display_df = df.copy()
-    for column in ("Total NF", "Produtos", "ICMS"):
-        display_df[column] = display_df[column].map(_format_currency)
+    for column in TOTAL_COLUMNS.values():
+        display_df[column] = format_brl_series(display_df[column])
     st.dataframe(display_df, use_container_width=True)
 
     if len(df) > 1:
-        numeric = df.drop(columns=["Arquivo"]).apply(pd.to_numeric, errors="coerce").fillna(0.0)
-        diff = numeric.diff().fillna(0.0)
+        diff = df.drop(columns=["Arquivo"]).diff().fillna(0.0)
         diff.insert(0, "Arquivo", df["Arquivo"])
 
         diff_display = diff.copy()
-        for column in ("Total NF", "Produtos", "ICMS"):
-            diff_display[column] = diff_display[column].map(_format_currency)
+        for column in TOTAL_COLUMNS.values():
+            diff_display[column] = format_brl_series(diff_display[column])
 
         st.markdown("#### Diferenças entre uploads consecutivos")
         st.dataframe(diff_display, use_container_width=True)
 
-        maior = df.loc[df["Total NF"].idxmax()]
-        menor = df.loc[df["Total NF"].idxmin()]
-        st.markdown(f"📈 **Maior valor:** {maior['Arquivo']} ({_format_currency(maior['Total NF'])})")
-        st.markdown(f"📉 **Menor valor:** {menor['Arquivo']} ({_format_currency(menor['Total NF'])})")
+        totals_nf = df["Total NF"].to_numpy()
+        maior = df.iloc[int(totals_nf.argmax())]
+        menor = df.iloc[int(totals_nf.argmin())]
+        st.markdown(f"📈 **Maior valor:** {maior['Arquivo']} ({format_brl(maior['Total NF'])})")
+        st.markdown(f"📉 **Menor valor:** {menor['Arquivo']} ({format_brl(menor['Total NF'])})")
+
+
+def _json_block(value: Any) -> str:
+    # st.json re-serializes dicts with the stdlib encoder but takes a JSON
+    # string as-is; orjson is much cheaper for the nested summary and diffs.
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
 
 
 def render_discrepancies_panel(compare_result: Optional[Dict[str, Any]]) -> None:
@@ -75,7 +74,7 @@ def render_discrepancies_panel(compare_result: Optional[Dict[str, Any]]) -> None
     summary = compare_result.get("summary") or {}
 
     with st.expander("Resumo (contagens por CFOP, NCM, CST)", expanded=True):
-        st.json(summary)
+        st.json(_json_block(summary))
 
     if insights:
         st.markdown("**Insights automáticos**:")
@@ -83,11 +82,23 @@ def render_discrepancies_panel(compare_result: Optional[Dict[str, Any]]) -> None
             st.markdown(f"- {tip}")
 
     if discrepancies:
+        import pandas as pd
+
+        # One table plus one detail block instead of two elements per pair.
+        shown = discrepancies[:DISCREPANCIES_LIMIT]
+        pairs = pd.DataFrame(
+            {
+                "Documento A": [item.get("a_source") or "Documento A" for item in shown],
+                "Documento B": [item.get("b_source") or "Documento B" for item in shown],
+            }
+        )
         st.markdown("**Discrepâncias detectadas (A vs B):**")
-        for item in discrepancies[:200]:
-            a_src = item.get("a_source") or "Documento A"
-            b_src = item.get("b_source") or "Documento B"
-            st.markdown(f"- **{a_src}** ↔ **{b_src}**")
-            st.json(item.get("diffs") or {})
+        st.dataframe(pairs, use_container_width=True)
+        selected = st.selectbox(
+            "Ver diferenças",
+            range(len(shown)),
+            format_func=lambda index: f"{index + 1}. {pairs.iat[index, 0]} ↔ {pairs.iat[index, 1]}",
+        )
+        st.json(_json_block(shown[selected].get("diffs") or {}))
     else:
         st.success("Sem discrepâncias materiais entre os documentos processados.")